@@ -1,16 +1,91 @@
 from __future__ import annotations
-import queue
 import numpy as np
 
+
+class AudioRingBuffer:
+    """
+    Preallocated single-producer / single-consumer sample ring.
+      - write() is called from the audio callback only, read_into()/read()/clear() from one consumer only
+      - _w/_r are monotonically increasing sample counters; each side only assigns its own,
+        so no lock is needed on CPython
+      - bounded, drop-oldest: the producer never blocks or fails; if the consumer stalls for
+        more than `capacity` samples, the oldest audio is overwritten, skipped on the next read
+        and counted in `dropped` (samples). Falling behind loses old audio, never memory.
+      - int16 rings hold raw PCM; reading into a float array converts and scales by 1/32768
+        in the same pass
+    """
+    def __init__(self, capacity: int, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.buf = np.empty(self.capacity, dtype=dtype)
+        self.scale = 1.0 / 32768.0 if self.buf.dtype == np.int16 else 1.0
+        self._w = 0
+        self._r = 0
+        self.dropped = 0
+
+    def available(self) -> int:
+        return min(self._w - self._r, self.capacity)
+
+    def write(self, samples: np.ndarray) -> None:
+        k = len(samples)
+        if k > self.capacity:
+            # Only the newest `capacity` samples fit; the rest count as overwritten
+            self._w += k - self.capacity
+            samples = samples[k - self.capacity:]
+            k = self.capacity
+        idx = self._w % self.capacity
+        first = min(k, self.capacity - idx)
+        np.copyto(self.buf[idx:idx + first], samples[:first])
+        if first < k:
+            np.copyto(self.buf[:k - first], samples[first:])
+        self._w += k
+
+    def read_into(self, out: np.ndarray) -> int:
+        w = self._w
+        r = self._r
+        if w - r > self.capacity:
+            # Lapped by the producer: skip the overwritten (oldest) samples
+            self.dropped += w - r - self.capacity
+            r = w - self.capacity
+        k = min(len(out), w - r)
+        if k <= 0:
+            self._r = r
+            return 0
+        idx = r % self.capacity
+        first = min(k, self.capacity - idx)
+        self._copy_out(out[:first], self.buf[idx:idx + first])
+        if first < k:
+            self._copy_out(out[first:k], self.buf[:k - first])
+        self._r = r + k
+        return k
+
+    def read(self, dtype=None) -> np.ndarray:
+        out = np.empty(self.available(), dtype=dtype or self.buf.dtype)
+        return out[:self.read_into(out)]
+
+    def _copy_out(self, dst: np.ndarray, src: np.ndarray) -> None:
+        if dst.dtype == src.dtype:
+            np.copyto(dst, src)
+        else:
+            np.multiply(src, dst.dtype.type(self.scale), out=dst, casting="unsafe")
+
+    def clear(self) -> None:
+        self._r = self._w
+
+
 class AudioCapture:
     """
     Microphone capture using sounddevice, but imported lazily inside start()
     to reduce startup failures.
+    The callback writes raw int16 PCM into a preallocated ring (no per-block allocation,
+    conversion or queue lock); consumers poll read()/read_into() and get float32 in [-1, 1).
+
+    Consumer contract: mono float32 in [-1, 1) at `sample_rate`, i.e. what Whisper takes
+    without any further cast or scaling. Other mic backends must deliver the same.
     """
-    def __init__(self, out_queue: "queue.Queue[np.ndarray]", sample_rate: int = 16000, block_ms: int = 500):
-        self.q = out_queue
+    def __init__(self, sample_rate: int = 16000, block_ms: int = 500, ring_seconds: float = 30.0):
         self.sample_rate = sample_rate
         self.blocksize = int(sample_rate * (block_ms / 1000))
+        self.ring = AudioRingBuffer(int(sample_rate * ring_seconds), dtype=np.int16)
         self.stream = None
         self._running = False
 
@@ -20,11 +95,11 @@ class AudioCapture:
         import sounddevice as sd
 
         self._running = True
-        self.stream = sd.InputStream(
+        self.stream = sd.RawInputStream(
             channels=1,
             samplerate=self.sample_rate,
             blocksize=self.blocksize,
-            dtype="float32",
+            dtype="int16",
             callback=self._callback
         )
         self.stream.start()
@@ -37,14 +112,17 @@ class AudioCapture:
             self.stream = None
 
     def reset(self):
-        try:
-            while True:
-                self.q.get_nowait()
-        except queue.Empty:
-            pass
+        self.ring.clear()
+
+    def read(self) -> np.ndarray:
+        return self.ring.read(np.float32)
+
+    def read_into(self, out: np.ndarray) -> int:
+        if out.dtype != np.float32:
+            raise TypeError(f"AudioCapture delivers float32 audio, got a {out.dtype} buffer")
+        return self.ring.read_into(out)
 
     def _callback(self, indata, frames, time, status):
         if not self._running:
             return
-        audio = np.squeeze(indata.copy())
-        self.q.put(audio)
+        self.ring.write(np.frombuffer(indata, dtype=np.int16))
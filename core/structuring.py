@@ -1,24 +1,34 @@
 from __future__ import annotations
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from core.term_correction import TermCorrector
+
+FIELDS = ("location", "lesion", "feature")
 
 class Structurer:
-    def __init__(self, categories: Dict[str, List[str]], key_to_canonical: Optional[Dict[str, str]] = None):
+    def __init__(
+        self,
+        categories: Dict[str, List[str]],
+        key_to_canonical: Optional[Dict[str, str]] = None,
+        corrector: Optional["TermCorrector"] = None,
+    ):
         self.categories = categories
         self.key_to_canonical = key_to_canonical or {}
+        # With a corrector, known canonicals are found with its automaton in one pass over the text
+        self.corrector = corrector
+        self._field_canons = {
+            field: [self.key_to_canonical.get(key, key) for key in self.categories.get(field, [])]
+            for field in FIELDS
+        }
 
     def extract(self, corrected_text: str) -> Dict:
         out = {"location": None, "lesion": None, "feature": None, "notes": ""}
-        for key in self.categories.get("location", []):
-            canon = self.key_to_canonical.get(key, key)
-            if canon in corrected_text:
-                out["location"] = canon
-        for key in self.categories.get("lesion", []):
-            canon = self.key_to_canonical.get(key, key)
-            if canon in corrected_text:
-                out["lesion"] = canon
-        for key in self.categories.get("feature", []):
-            canon = self.key_to_canonical.get(key, key)
-            if canon in corrected_text:
-                out["feature"] = canon
+        found = self.corrector.canonicals_in(corrected_text) if self.corrector else set()
+        indexed = self.corrector.canonicals if self.corrector else set()
+        for field in FIELDS:
+            for canon in self._field_canons[field]:
+                if (canon in found) if canon in indexed else (canon in corrected_text):
+                    out[field] = canon
         out["notes"] = "Auto-extracted (PoC)"
         return out
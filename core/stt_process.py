@@ -1,41 +1,76 @@
 from __future__ import annotations
 import os
 import time
-import queue as pyqueue
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+from core.audio_capture import AudioRingBuffer
 
-def stt_worker_main(out_q, ctrl_q, cfg: dict):
+
+def _rms(audio: np.ndarray) -> float:
+    """RMS via a single dot product (no squared temporary)."""
+    n = audio.size
+    return float(np.sqrt(np.dot(audio, audio) / n)) if n else 0.0
+
+
+def stt_worker_main(out_q, ctrl_q, cfg: dict, level=None):
     """
     Subprocess STT worker (Windows-safe):
-      - Captures mic audio via sounddevice (InputStream callback -> queue)
+      - Captures mic audio via sounddevice (RawInputStream int16 callback -> ring buffer)
+      - Windows handed to Whisper are contiguous float32 in [-1, 1); the int16 -> float32
+        cast happens once, when reading from the ring, so no astype() is needed downstream
       - Runs faster-whisper / ctranslate2 in this subprocess
       - Sends messages to UI via out_q
+      - If `level` (mp.Value('f')) is given, the mic RMS is written there instead of out_q
+    Control messages (ctrl_q):
+      - "START": open the mic stream and start transcribing
+      - "PAUSE": close the mic stream; the model stays loaded for the next START
+      - "RESET": drop buffered audio and in-flight results, then reply {"type":"reset"}
+      - "STOP": exit the subprocess
+    With cfg["wait_for_start"] the model is loaded up front and the mic only opens on START.
     Message types:
       - {"type":"status","msg": "..."}
-      - {"type":"audio_level","rms": float}
+      - {"type":"audio_level","rms": float}   (only when level is None)
       - {"type":"text","text": str}
       - {"type":"error","msg": str}
+      - {"type":"ready"}   (model loaded, waiting for START; only with wait_for_start)
+      - {"type":"reset"}   (everything queued before it belongs to the previous session)
     """
-    # Conservative native settings
-    os.environ.setdefault("CT2_FORCE_CPU_ISA", "GENERIC")
-    os.environ.setdefault("OMP_NUM_THREADS", "1")
-    os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
-    os.environ.setdefault("MKL_NUM_THREADS", "1")
-    os.environ.setdefault("NUMEXPR_NUM_THREADS", "1")
+    # Native settings: let CTranslate2 pick its CPU ISA (AVX2/AVX-512) and use several cores.
+    # STT_SAFE_ISA=1 restores the old conservative settings (crash triage only).
+    # num_workers > 1 lets the next window's transcribe overlap with the previous one.
+    if os.environ.get("STT_SAFE_ISA", "0") == "1":
+        os.environ.setdefault("CT2_FORCE_CPU_ISA", "GENERIC")
+        cpu_threads = 1
+        num_workers = 1
+    else:
+        num_workers = max(1, int(cfg.get("num_workers", 2)))
+        cpu_threads = int(cfg.get("cpu_threads") or max(1, min(4, (os.cpu_count() or 1) // num_workers)))
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ.setdefault(var, str(cpu_threads))
 
     # Imports inside subprocess (spawn-safe)
     import sounddevice as sd
-    from faster_whisper import WhisperModel
+    from faster_whisper import BatchedInferencePipeline, WhisperModel
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    from core.stt_whisper import (
+        GREEDY_DECODE_OPTIONS, encode_prompt, pick_compute_type, probe_compute_types, resolve_model_size,
+    )
+
+    # STT_CT2_LOG=info makes CTranslate2 log the detected CPU ISA (AVX2/AVX-512) at model load
+    if os.environ.get("STT_CT2_LOG"):
+        import ctranslate2
+        ctranslate2.set_log_level(getattr(logging, os.environ["STT_CT2_LOG"].upper(), logging.INFO))
 
     # Config
     sample_rate = int(cfg.get("sample_rate", 16000))
     block_ms = int(cfg.get("block_ms", 250))
     blocksize = int(sample_rate * (block_ms / 1000.0))
 
-    model_size = cfg.get("model_size", "tiny")
     device = cfg.get("device", "cpu")
-    compute_type = cfg.get("compute_type", "int8")
+    compute_type = pick_compute_type(device, cfg.get("compute_type", "auto"))
     beam_size = int(cfg.get("beam_size", 1))
     vad_filter = bool(cfg.get("vad_filter", False))
     initial_prompt = cfg.get("initial_prompt", "")
@@ -48,6 +83,11 @@ def stt_worker_main(out_q, ctrl_q, cfg: dict):
     if env_lang:
         language = None if env_lang.lower() == "auto" else env_lang
 
+    # Model: cfg["model_size"] / env STT_MODEL (name or local CT2 dir, e.g. distil-small.en);
+    # English-only distil/.en models fall back to cfg["fallback_model_size"] for ko/auto
+    fallback_model = cfg.get("fallback_model_size", "tiny")
+    model_size = resolve_model_size(cfg.get("model_size", "tiny"), language, fallback_model)
+
     # Mic device selection
     input_device = cfg.get("input_device", None)
     try:
@@ -60,141 +100,293 @@ def stt_worker_main(out_q, ctrl_q, cfg: dict):
     min_seconds = float(cfg.get("min_seconds", 2.5))
     target_samples = int(sample_rate * min_seconds)
     energy_threshold = float(cfg.get("energy_threshold", 0.005))
+    # Silero VAD (bundled with faster-whisper) before the encoder; skips windows without speech
+    vad_gate = bool(cfg.get("vad_gate", True))
+    vad_options = VadOptions(threshold=float(cfg.get("vad_threshold", 0.5)))
+    # When STT falls behind, up to batch_max queued windows go through one batched encoder call
+    batch_max = max(1, int(cfg.get("batch_max", 4)))
 
-    out_q.put({"type": "status", "msg": f"Loading STT model ({model_size}) in subprocess..."})
+    supported, probe_error = probe_compute_types(device)
+    if probe_error:
+        out_q.put({"type": "status", "msg": f"CTranslate2 {device} compute type probe failed ({probe_error}); using {compute_type}"})
+    else:
+        out_q.put({"type": "status", "msg": f"CTranslate2 {device} compute types: {', '.join(sorted(supported)) or 'none'}"})
+    if os.environ.get("CT2_FORCE_CPU_ISA"):
+        out_q.put({"type": "status", "msg": f"CT2_FORCE_CPU_ISA={os.environ['CT2_FORCE_CPU_ISA']}"})
+    out_q.put({"type": "status", "msg": f"Loading STT model ({model_size}, {compute_type}, language={language}) in subprocess..."})
     try:
         model = WhisperModel(
             model_size,
             device=device,
             compute_type=compute_type,
-            cpu_threads=1,
-            num_workers=1,
+            cpu_threads=cpu_threads,
+            num_workers=num_workers,
         )
     except Exception as e:
         out_q.put({"type": "error", "msg": f"Failed to init WhisperModel: {e}"})
         return
 
+    pipe = BatchedInferencePipeline(model=model) if batch_max > 1 else None
+    # Prompt tokenized once for model.transcribe (the batched pipeline only accepts the text)
+    prompt_tokens = encode_prompt(model, initial_prompt)
+
+    # Warm-up: 1 s of silence through encoder+decoder so lazy kernel init doesn't hit the first window.
+    # Same decode options as transcribe(); vad_filter stays off or the silence never reaches the encoder.
+    if cfg.get("warmup", True):
+        try:
+            segments, _info = model.transcribe(
+                np.zeros(sample_rate, dtype=np.float32),
+                language=language,
+                beam_size=beam_size,
+                vad_filter=False,
+                initial_prompt=prompt_tokens,
+                **GREEDY_DECODE_OPTIONS,
+            )
+            for _seg in segments:
+                pass
+        except Exception as e:
+            out_q.put({"type": "status", "msg": f"Warm-up skipped: {e}"})
     out_q.put({"type": "status", "msg": "STT model loaded."})
 
-    audio_q: "pyqueue.Queue[np.ndarray]" = pyqueue.Queue()
+    # Raw int16 PCM; converted to float32 once, when read into the window buffer
+    ring = AudioRingBuffer(sample_rate * 30, dtype=np.int16)
     running = True
 
-    # RMS meter
+    # RMS meter (computed on the consumer side)
     last_level_t = time.time()
     last_rms = 0.0
+    reported_dropped = 0
 
     def callback(indata, frames, t, status):
-        nonlocal last_rms
         try:
-            audio = np.squeeze(indata.copy()).astype(np.float32)
-            if audio.size:
-                last_rms = float(np.sqrt(np.mean(np.square(audio))))
-            audio_q.put(audio)
+            ring.write(np.frombuffer(indata, dtype=np.int16))
         except Exception as e:
             try:
                 out_q.put({"type": "error", "msg": f"audio callback error: {e}"})
             except Exception:
                 pass
 
-    try:
-        stream = sd.InputStream(
-            device=input_device,
-            channels=1,
-            samplerate=sample_rate,
-            blocksize=blocksize,
-            dtype="float32",
-            callback=callback,
-        )
-        stream.start()
-    except Exception as e:
-        out_q.put({"type": "error", "msg": f"Failed to start InputStream: {e}"})
-        return
+    stream = None
+
+    def open_stream() -> bool:
+        nonlocal stream
+        try:
+            stream = sd.RawInputStream(
+                device=input_device,
+                channels=1,
+                samplerate=sample_rate,
+                blocksize=blocksize,
+                dtype="int16",
+                callback=callback,
+            )
+            stream.start()
+        except Exception as e:
+            stream = None
+            out_q.put({"type": "error", "msg": f"Failed to start RawInputStream: {e}"})
+            return False
+        out_q.put({"type": "status", "msg": "Listening (subprocess)..."})
+        return True
 
-    out_q.put({"type": "status", "msg": "Listening (subprocess)..."})
+    def close_stream():
+        nonlocal stream
+        try:
+            if stream is not None:
+                stream.stop()
+                stream.close()
+        except Exception:
+            pass
+        stream = None
 
-    buffer: list[np.ndarray] = []
+    # Accumulation buffer: preallocated (room for batch_max windows) + write index
+    buf = np.empty(target_samples * batch_max, dtype=np.float32)
+    n = 0
+    # One scratch buffer per in-flight transcribe, recycled (buf is reused for the next window)
+    free_scratch = deque(np.empty(target_samples * batch_max, dtype=np.float32) for _ in range(num_workers))
     empty_count = 0
     ok_count = 0
+    # Bumped on RESET; results submitted under an older epoch are discarded in emit()
+    epoch = 0
+
+    def transcribe(audio: np.ndarray, clips=None):
+        t0 = time.time()
+        if clips:
+            # One batched call; each clip (seconds) is one batch item, segments come back in order
+            segments, _info = pipe.transcribe(
+                audio,
+                language=language,
+                beam_size=beam_size,
+                vad_filter=False,
+                initial_prompt=initial_prompt,
+                clip_timestamps=clips,
+                batch_size=len(clips),
+                **GREEDY_DECODE_OPTIONS,
+            )
+        else:
+            segments, _info = model.transcribe(
+                audio,
+                language=language,
+                beam_size=beam_size,
+                vad_filter=vad_filter,
+                initial_prompt=prompt_tokens,
+                **GREEDY_DECODE_OPTIONS,
+            )
+        parts = []
+        for seg in segments:
+            if getattr(seg, "text", None):
+                parts.append(seg.text.strip())
+        return " ".join(parts).strip(), time.time() - t0
+
+    def has_speech(window: np.ndarray) -> bool:
+        # Energy gate
+        rms_now = _rms(window)
+        if rms_now < energy_threshold:
+            out_q.put({"type": "status", "msg": f"Too quiet (rms={rms_now:.4f})"})
+            return False
+
+        # VAD gate
+        if vad_gate and not get_speech_timestamps(window, vad_options, sampling_rate=sample_rate):
+            out_q.put({"type": "status", "msg": "No speech (VAD)"})
+            return False
+
+        # Only rescale (in place) if the input clips; Whisper's log-mel handles level otherwise
+        peak = float(max(window.max(), -window.min()))
+        if peak > 1.0:
+            np.multiply(window, 1.0 / peak, out=window)
+        return True
+
+    def submit(audio: np.ndarray, clips=None):
+        scratch = free_scratch.popleft()
+        view = scratch[:len(audio)]
+        np.copyto(view, audio)
+        pending.append((pool.submit(transcribe, view, clips), scratch, epoch))
+
+    def emit(entry):
+        nonlocal ok_count, empty_count
+        fut, scratch, entry_epoch = entry
+        try:
+            text, dt = fut.result()
+        except Exception as e:
+            out_q.put({"type": "error", "msg": f"transcribe error: {e}"})
+            return
+        finally:
+            free_scratch.append(scratch)
+        if entry_epoch != epoch:
+            return
+        if text:
+            ok_count += 1
+            out_q.put({"type": "status", "msg": f"OK ({ok_count}) in {dt:.2f}s"})
+            out_q.put({"type": "text", "text": text})
+        else:
+            empty_count += 1
+            out_q.put({"type": "status", "msg": f"No speech ({empty_count}) in {dt:.2f}s"})
+
+    # Up to num_workers transcribes in flight (never waited on by the capture loop);
+    # results are emitted in submission order
+    pool = ThreadPoolExecutor(max_workers=num_workers)
+    pending: deque = deque()
+
+    if cfg.get("wait_for_start", False):
+        listening = False
+        out_q.put({"type": "status", "msg": "STT ready (model loaded). Press Start."})
+        out_q.put({"type": "ready"})
+    else:
+        listening = open_stream()
+        if not listening:
+            pool.shutdown(wait=False)
+            return
 
     try:
         while running:
             # Periodic audio level report
             now = time.time()
-            if now - last_level_t >= 1.0:
-                out_q.put({"type": "audio_level", "rms": float(last_rms)})
+            if listening and now - last_level_t >= 1.0:
+                if level is not None:
+                    level.value = last_rms
+                else:
+                    out_q.put({"type": "audio_level", "rms": float(last_rms)})
                 last_level_t = now
+                if ring.dropped > reported_dropped:
+                    lost = (ring.dropped - reported_dropped) / sample_rate
+                    reported_dropped = ring.dropped
+                    out_q.put({"type": "status", "msg": f"STT behind: dropped {lost:.1f}s of oldest audio"})
 
-            # Stop command?
+            # Control commands (block briefly while paused)
             try:
-                cmd = ctrl_q.get_nowait()
-                if cmd == "STOP":
-                    running = False
-                    break
+                cmd = ctrl_q.get_nowait() if listening else ctrl_q.get(timeout=0.1)
             except Exception:
-                pass
+                cmd = None
+            if cmd == "STOP":
+                running = False
+                break
+            elif cmd == "START" and not listening:
+                ring.clear()
+                n = 0
+                listening = open_stream()
+            elif cmd == "PAUSE" and listening:
+                close_stream()
+                listening = False
+                if level is not None:
+                    level.value = -1.0
+                out_q.put({"type": "status", "msg": "Paused (model loaded)."})
+            elif cmd == "RESET":
+                epoch += 1
+                ring.clear()
+                n = 0
+                out_q.put({"type": "reset"})
 
-            # Consume audio
-            try:
-                chunk = audio_q.get(timeout=0.2)
-                buffer.append(chunk)
-            except pyqueue.Empty:
-                continue
-            except Exception as e:
-                out_q.put({"type": "error", "msg": f"audio queue error: {e}"})
+            # Finished transcribes (in order)
+            while pending and pending[0][0].done():
+                emit(pending.popleft())
+
+            if not listening:
                 continue
 
+            # Consume audio (the current window only; anything beyond stays in the ring)
+            if n < target_samples:
+                if not ring.available():
+                    time.sleep(0.01)
+                    continue
+                k = ring.read_into(buf[n:target_samples])
+                last_rms = _rms(buf[n:n + k])
+                n += k
+
             # Enough audio to transcribe?
-            if sum(len(x) for x in buffer) < target_samples:
+            if n < target_samples:
                 continue
 
-            audio = np.concatenate(buffer).astype(np.float32)
-            buffer.clear()
-
-            # Energy gate
-            rms_now = float(np.sqrt(np.mean(np.square(audio))) if audio.size else 0.0)
-            if rms_now < energy_threshold:
-                out_q.put({"type": "status", "msg": f"Too quiet (rms={rms_now:.4f})"})
+            # All workers busy: hold the window and let audio queue in the (bounded) ring.
+            # The loop never blocks on inference, so control messages and levels stay live.
+            if len(pending) >= num_workers:
+                time.sleep(0.01)
                 continue
 
-            # Normalize volume
-            peak = float(np.max(np.abs(audio))) if audio.size else 0.0
-            if peak > 0:
-                audio = (audio / peak).astype(np.float32)
+            # Backlog in the ring: take whole extra windows for one batched call
+            extra = min(ring.available() // target_samples, batch_max - 1)
+            if extra:
+                n += ring.read_into(buf[n:n + extra * target_samples])
 
-            # Transcribe with debug
-            out_q.put({"type": "status", "msg": "Transcribing..."})
-            t0 = time.time()
-            try:
-                segments, _info = model.transcribe(
-                    audio,
-                    language=language,
-                    beam_size=beam_size,
-                    vad_filter=vad_filter,
-                    initial_prompt=initial_prompt,
-                )
-            except Exception as e:
-                out_q.put({"type": "error", "msg": f"transcribe error: {e}"})
+            audio = buf[:n]
+            n = 0
+
+            windows = [audio[k:k + target_samples] for k in range(0, len(audio), target_samples)]
+            keep = [k for k, window in enumerate(windows) if has_speech(window)]
+            if not keep:
                 continue
-            dt = time.time() - t0
-
-            parts = []
-            for seg in segments:
-                if getattr(seg, "text", None):
-                    parts.append(seg.text.strip())
-            text = " ".join(parts).strip()
-
-            if text:
-                ok_count += 1
-                out_q.put({"type": "status", "msg": f"OK ({ok_count}) in {dt:.2f}s"})
-                out_q.put({"type": "text", "text": text})
+
+            if len(keep) == 1:
+                out_q.put({"type": "status", "msg": "Transcribing..."})
+                submit(windows[keep[0]])
             else:
-                empty_count += 1
-                out_q.put({"type": "status", "msg": f"No speech ({empty_count}) in {dt:.2f}s"})
+                clips = [
+                    {"start": k * target_samples / sample_rate, "end": (k + 1) * target_samples / sample_rate}
+                    for k in keep
+                ]
+                out_q.put({"type": "status", "msg": f"Transcribing ({len(keep)} windows, batched)..."})
+                submit(audio, clips)
 
     finally:
-        try:
-            stream.stop()
-            stream.close()
-        except Exception:
-            pass
+        close_stream()
+        while pending:
+            emit(pending.popleft())
+        pool.shutdown(wait=True)
         out_q.put({"type": "status", "msg": "Stopped (subprocess)."})
@@ -1,23 +1,110 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Optional, List
+from functools import lru_cache
+from typing import Optional, List, FrozenSet, Tuple
+import os
 import numpy as np
+import ctranslate2
 from faster_whisper import WhisperModel
 
+
+# Greedy decoding: no temperature fallback, no cross-window conditioning, no timestamp tokens
+GREEDY_DECODE_OPTIONS = dict(
+    best_of=1,
+    temperature=0.0,
+    condition_on_previous_text=False,
+    compression_ratio_threshold=2.4,
+    log_prob_threshold=-1.0,
+    no_speech_threshold=0.6,
+    without_timestamps=True,
+)
+
+
+@lru_cache(maxsize=None)
+def probe_compute_types(device: str) -> Tuple[FrozenSet[str], Optional[str]]:
+    """(compute types CTranslate2 supports on `device`, probe error message or None)."""
+    try:
+        return frozenset(ctranslate2.get_supported_compute_types(device)), None
+    except Exception as e:
+        return frozenset(), f"{type(e).__name__}: {e}"
+
+
+def supported_compute_types(device: str) -> FrozenSet[str]:
+    return probe_compute_types(device)[0]
+
+
+def pick_compute_type(device: str, requested: Optional[str] = None) -> str:
+    """
+    Resolve the CTranslate2 compute type for `device`.
+      - env STT_COMPUTE_TYPE overrides the requested value
+      - "auto" (default) probes the device once:
+        int8_float16 on GPU when both INT8 and FP16 are allowed, else int8, else float16;
+        int8 (the previous fixed value) when the probe fails or reports nothing
+    """
+    compute_type = os.environ.get("STT_COMPUTE_TYPE") or requested or "auto"
+    if compute_type != "auto":
+        return compute_type
+    supported = supported_compute_types(device)
+    if not supported:
+        return "int8"
+    if device != "cpu" and "int8_float16" in supported:
+        return "int8_float16"
+    if "int8" in supported:
+        return "int8"
+    if "float16" in supported:
+        return "float16"
+    return "int8"
+
+
+def is_english_only(model_size: str) -> bool:
+    """distil-whisper checkpoints and *.en models only transcribe English."""
+    name = os.path.basename(model_size.rstrip("/\\")).lower()
+    return name.endswith(".en") or "distil" in name
+
+
+def resolve_model_size(requested: str, language: Optional[str], fallback: str = "tiny") -> str:
+    """
+    Model name or local CTranslate2 directory to load.
+      - env STT_MODEL overrides the requested value (e.g. "distil-small.en" or a converted model path)
+      - English-only models fall back to `fallback` unless language is "en"
+    """
+    model_size = os.environ.get("STT_MODEL") or requested or fallback
+    if is_english_only(model_size) and language != "en":
+        return fallback
+    return model_size
+
+
+def encode_prompt(model: WhisperModel, prompt: str):
+    """
+    Token ids for `prompt`, encoded the way faster-whisper encodes a str initial_prompt,
+    so it is tokenized once instead of on every transcribe. Falls back to the text.
+    """
+    if not prompt:
+        return prompt
+    try:
+        return model.hf_tokenizer.encode(" " + prompt.strip(), add_special_tokens=False).ids
+    except Exception:
+        return prompt
+
+
 @dataclass
 class STTConfig:
     model_size: str = "tiny"
     device: str = "cpu"
-    compute_type: str = "int8"
+    compute_type: str = "auto"
     beam_size: int = 1
     vad_filter: bool = False
     language: Optional[str] = None
     initial_prompt: str = ""
+    fallback_model_size: str = "tiny"
 
 class WhisperSTT:
     def __init__(self, cfg: STTConfig):
         self.cfg = cfg
-        self.model = WhisperModel(cfg.model_size, device=cfg.device, compute_type=cfg.compute_type)
+        compute_type = pick_compute_type(cfg.device, cfg.compute_type)
+        model_size = resolve_model_size(cfg.model_size, cfg.language, cfg.fallback_model_size)
+        self.model = WhisperModel(model_size, device=cfg.device, compute_type=compute_type)
+        self._prompt = encode_prompt(self.model, cfg.initial_prompt)
 
     def transcribe(self, audio_f32: np.ndarray, sample_rate: int) -> str:
         segments, _info = self.model.transcribe(
@@ -25,7 +112,8 @@ class WhisperSTT:
             language=self.cfg.language,
             beam_size=self.cfg.beam_size,
             vad_filter=self.cfg.vad_filter,
-            initial_prompt=self.cfg.initial_prompt
+            initial_prompt=self._prompt,
+            **GREEDY_DECODE_OPTIONS,
         )
         parts: List[str] = []
         for seg in segments:
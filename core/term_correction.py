@@ -1,8 +1,20 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Set, Tuple
 import json
-from Levenshtein import ratio as lev_ratio
+import os
+import pickle
+import ahocorasick
+from rapidfuzz import process, fuzz
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # stdlib fallback
+    _json_loads = json.loads
+
+# Bump when TermCorrector's pickled state changes so stale terms caches are rebuilt
+_CACHE_VERSION = 2
 
 @dataclass(frozen=True)
 class Term:
@@ -16,6 +28,7 @@ class TermCorrector:
         self.threshold = threshold
         self.direct: Dict[str, str] = {}
         self.key_to_canonical: Dict[str, str] = {}
+        self.canonicals: Set[str] = {t.canonical for t in terms}
 
         for t in terms:
             self.key_to_canonical[t.key] = t.canonical
@@ -23,59 +36,126 @@ class TermCorrector:
             for a in t.aliases:
                 self.direct[a.lower()] = t.canonical
 
+        # Fuzzy candidates: lowercased canonical/alias -> canonical (first term wins on duplicates)
+        self._fuzzy_choices: Dict[str, str] = {}
+        for t in terms:
+            for a in [t.canonical] + t.aliases:
+                self._fuzzy_choices.setdefault(a.lower(), t.canonical)
+
+        # Multi-pattern matcher over all lowercased aliases (one pass per text)
+        self._ac = ahocorasick.Automaton()
+        for alias_l, canon in self.direct.items():
+            if alias_l:
+                self._ac.add_word(alias_l, (alias_l, canon))
+        if len(self._ac):
+            self._ac.make_automaton()
+
     @staticmethod
     def load(path: str) -> Tuple["TermCorrector", Dict]:
-        with open(path, "r", encoding="utf-8") as f:
-            obj = json.load(f)
+        """
+        Load terms.json. The built corrector (tables + automaton) is pickled next to it
+        (<name>.cache.pkl) and reused while the JSON's mtime/size are unchanged.
+        """
+        cache_path = os.path.splitext(path)[0] + ".cache.pkl"
+        st = os.stat(path)
+        cache_key = (_CACHE_VERSION, st.st_mtime_ns, st.st_size)
+        try:
+            with open(cache_path, "rb") as f:
+                cached_key, corrector, categories = pickle.load(f)
+            if cached_key == cache_key:
+                return corrector, categories
+        except Exception:
+            pass
+
+        with open(path, "rb") as f:
+            obj = _json_loads(f.read())
         terms = [Term(key=x["key"], canonical=x["canonical"], aliases=x.get("aliases", [])) for x in obj["terms"]]
-        return TermCorrector(terms), obj.get("categories", {})
+        corrector, categories = TermCorrector(terms), obj.get("categories", {})
+
+        try:
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump((cache_key, corrector, categories), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            pass
+        return corrector, categories
 
     def correct(self, text: str) -> Tuple[str, List[Dict]]:
         raw = text
         lowered = raw.lower()
         changes: List[Dict] = []
 
-        for alias_l, canon in sorted(self.direct.items(), key=lambda x: -len(x[0])):
-            if alias_l and alias_l in lowered:
-                before = raw
-                raw = replace_case_insensitive(raw, alias_l, canon)
-                if raw != before:
+        # Single pass over the one lowered snapshot; the lowered result is built alongside
+        matches = self._direct_matches(lowered)
+        if matches:
+            out: List[str] = []
+            out_l: List[str] = []
+            last = 0
+            for start, end, alias_l, canon in matches:
+                out.append(raw[last:start])
+                out.append(canon)
+                out_l.append(lowered[last:start])
+                out_l.append(canon.lower())
+                if raw[start:end] != canon:
                     changes.append({"from": alias_l, "to": canon, "score": 1.0})
-                    lowered = raw.lower()
+                last = end
+            out.append(raw[last:])
+            out_l.append(lowered[last:])
+            raw = "".join(out)
+            lowered = "".join(out_l)
 
         tokens = raw.split()
+        tokens_l = lowered.split()
         i = 0
         while i < len(tokens):
-            replaced = False
-            for j in range(min(i + 3, len(tokens)), i, -1):
-                cand = " ".join(tokens[i:j])
-                if len(cand) < 4:
-                    continue
-                cand_l = cand.lower()
-                if cand_l in self.direct:
-                    continue
-
-                best_score = 0.0
-                best_to = None
-                for t in self.terms:
-                    for a in [t.canonical] + t.aliases:
-                        s = lev_ratio(cand_l, a.lower())
-                        if s > best_score:
-                            best_score = s
-                            best_to = t.canonical
-
-                if best_to and best_score >= self.threshold:
-                    tokens[i:j] = [best_to]
-                    changes.append({"from": cand, "to": best_to, "score": float(best_score)})
-                    replaced = True
-                    break
-            i += 1 if not replaced else 1
+            hit = self._fuzzy_match(tokens_l, i)
+            if hit is not None:
+                j, best_to, best_score = hit
+                changes.append({"from": " ".join(tokens[i:j]), "to": best_to, "score": best_score})
+                tokens[i:j] = [best_to]
+                tokens_l[i:j] = [best_to.lower()]
+            i += 1
 
         return " ".join(tokens), changes
 
-def replace_case_insensitive(text: str, needle_lower: str, replacement: str) -> str:
-    t_low = text.lower()
-    idx = t_low.find(needle_lower)
-    if idx < 0:
-        return text
-    return text[:idx] + replacement + text[idx + len(needle_lower):]
+    def canonicals_in(self, text: str) -> Set[str]:
+        """Canonical terms occurring verbatim (case-sensitive) in `text`, found in one automaton pass."""
+        found: Set[str] = set()
+        if self._ac.kind != ahocorasick.AHOCORASICK:
+            return found
+        for end_idx, (alias_l, _canon) in self._ac.iter(text.lower()):
+            hit = text[end_idx + 1 - len(alias_l):end_idx + 1]
+            if hit in self.canonicals:
+                found.add(hit)
+        return found
+
+    def _fuzzy_match(self, tokens_l: List[str], start: int) -> Optional[Tuple[int, str, float]]:
+        """Longest window of up to 3 lowercased tokens at `start` close to a known alias: (end, canonical, score)."""
+        for j in range(min(start + 3, len(tokens_l)), start, -1):
+            cand_l = " ".join(tokens_l[start:j])
+            if len(cand_l) < 4 or cand_l in self.direct:
+                continue
+            match = process.extractOne(
+                cand_l, self._fuzzy_choices.keys(), scorer=fuzz.ratio, score_cutoff=self.threshold * 100
+            )
+            if match is not None:
+                return j, self._fuzzy_choices[match[0]], match[1] / 100.0
+        return None
+
+    def _direct_matches(self, lowered: str) -> List[Tuple[int, int, str, str]]:
+        """Non-overlapping alias hits in `lowered`, longest match wins, sorted by start."""
+        if self._ac.kind != ahocorasick.AHOCORASICK:
+            return []
+        hits = []
+        for end_idx, (alias_l, canon) in self._ac.iter(lowered):
+            end = end_idx + 1
+            hits.append((end - len(alias_l), end, alias_l, canon))
+        hits.sort(key=lambda h: (h[0] - h[1], h[0]))
+
+        taken: List[Tuple[int, int, str, str]] = []
+        for h in hits:
+            if all(h[1] <= s or h[0] >= e for s, e, _, _ in taken):
+                taken.append(h)
+        taken.sort()
+        return taken
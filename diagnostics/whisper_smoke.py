@@ -1,5 +1,6 @@
 import os, numpy as np
-os.environ["CT2_FORCE_CPU_ISA"]="GENERIC"
+if os.environ.get("STT_SAFE_ISA", "0") == "1":
+    os.environ["CT2_FORCE_CPU_ISA"]="GENERIC"
 from faster_whisper import WhisperModel
 print("[whisper_smoke] loading tiny", flush=True)
 m=WhisperModel("tiny", device="cpu", compute_type="int8")
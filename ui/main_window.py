@@ -1,11 +1,12 @@
 from __future__ import annotations
 import os
+import time
 import datetime
 import multiprocessing as mp
 from queue import Empty
 
-from PySide6.QtCore import Qt, QTimer
-from PySide6.QtGui import QKeySequence, QShortcut
+from PySide6.QtCore import Qt, QTimer, QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtGui import QKeySequence, QShortcut, QTextCursor
 from PySide6.QtWidgets import (
     QMainWindow, QTextEdit, QPushButton, QLabel, QVBoxLayout, QWidget,
     QHBoxLayout, QMessageBox
@@ -13,6 +14,9 @@ from PySide6.QtWidgets import (
 
 SAFE_MODE = os.environ.get("SAFE_MODE", "0") == "1"
 
+# Whisper keeps at most ~224 prompt tokens; longer examples are only wasted tokenization
+PROMPT_EXAMPLES_MAX_CHARS = 1024
+
 if not SAFE_MODE:
     from core.term_correction import TermCorrector
     from core.structuring import Structurer
@@ -21,6 +25,30 @@ if not SAFE_MODE:
     from core.stt_process import stt_worker_main
 
 
+class _ReportSignals(QObject):
+    ready = Signal(str, str, object)  # final_text, report, structured
+    failed = Signal(str)
+
+
+class _ReportTask(QRunnable):
+    """Structuring + template rendering on a QThreadPool thread (keeps the GUI responsive)."""
+    def __init__(self, structurer, renderer, final_text: str, signals: _ReportSignals):
+        super().__init__()
+        self.structurer = structurer
+        self.renderer = renderer
+        self.final_text = final_text
+        self.signals = signals
+
+    def run(self):
+        try:
+            structured = self.structurer.extract(self.final_text)
+            report = self.renderer.render(structured=structured, cleaned_text=self.final_text)
+        except Exception as e:
+            self.signals.failed.emit(f"{e!r}")
+            return
+        self.signals.ready.emit(self.final_text, report, structured)
+
+
 class MainWindow(QMainWindow):
     def _log(self, msg: str):
         ts = datetime.datetime.now().strftime('%H:%M:%S')
@@ -106,26 +134,36 @@ class MainWindow(QMainWindow):
 
         # Domain logic
         self.corrector, categories = TermCorrector.load(os.path.join(self.assets_dir, "terms.json"))
-        self.structurer = Structurer(categories, key_to_canonical=self.corrector.key_to_canonical)
+        self.structurer = Structurer(categories, key_to_canonical=self.corrector.key_to_canonical, corrector=self.corrector)
         self.renderer = ReportRenderer(os.path.join(self.assets_dir, "templates"))
 
         # Subprocess handles audio+STT
-        prompt = self._build_prompt()
+        self._prompt = self._build_prompt()
         lang = os.environ.get('STT_LANG', 'ko')
         self._stt_cfg = dict(
-            model_size="tiny",
+            model_size="base",
             device="cpu",
             compute_type="int8",
             beam_size=1,
             vad_filter=False,
             language=None,
-            initial_prompt=prompt,
+            initial_prompt=self._prompt,
             sample_rate=16000,
             block_ms=500,
+            wait_for_start=True,
+            # Paused this long, the STT subprocess exits to free the model; next Start reloads it
+            stt_idle_release_seconds=float(os.environ.get("STT_IDLE_RELEASE_SECONDS", 120)),
         )
         self._stt_proc: mp.Process | None = None
+        self._listening = False
         self._out_q = None
         self._ctrl_q = None
+        self._rms = None
+        self._last_level_t = 0.0
+        # Set when the worker reports the model loaded; the idle-release timer only runs after that
+        self._stt_ready = False
+        # Set by reset(); text is discarded until the worker acknowledges with {"type": "reset"}
+        self._discard_text = False
 
         # Poll subprocess queue from UI thread
         self._timer = QTimer(self)
@@ -133,6 +171,10 @@ class MainWindow(QMainWindow):
         self._timer.timeout.connect(self._drain_out_queue)
         self._timer.start()
 
+        self._idle_timer = QTimer(self)
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.timeout.connect(self._release_stt)
+
         # shortcuts
         QShortcut(QKeySequence("F2"), self, activated=self.toggle)
         QShortcut(QKeySequence("F3"), self, activated=self.reset)
@@ -140,6 +182,16 @@ class MainWindow(QMainWindow):
         QShortcut(QKeySequence("Ctrl+S"), self, activated=self.save)
 
         self.last_report = ""
+        # Text/structure the last report was generated from; cleared whenever the editor changes
+        self._last_final_text: str | None = None
+        self._last_structured: dict | None = None
+        self.text_edit.textChanged.connect(self._invalidate_report_cache)
+        self._report_signals = _ReportSignals(self)
+        self._report_signals.ready.connect(self._on_report_ready)
+        self._report_signals.failed.connect(self._on_report_failed)
+
+        # Warm-load the STT model now; F2 then only opens/closes the mic in the subprocess
+        self._start_stt_process()
 
     def _build_prompt(self) -> str:
         ex_path = os.path.join(self.assets_dir, "examples.txt")
@@ -147,6 +199,9 @@ class MainWindow(QMainWindow):
         if os.path.exists(ex_path):
             with open(ex_path, "r", encoding="utf-8") as f:
                 examples = f.read().strip()
+        if len(examples) > PROMPT_EXAMPLES_MAX_CHARS:
+            cut = examples[:PROMPT_EXAMPLES_MAX_CHARS]
+            examples = cut[:cut.rfind("\n")] if "\n" in cut else cut
         return (
             "You are transcribing an ultrasound medical dictation.\n"
             "Korean and English mixed medical terms must be written in correct English spelling.\n"
@@ -162,9 +217,12 @@ class MainWindow(QMainWindow):
             self._log(f"INPUT_DEVICE={os.environ.get('INPUT_DEVICE')}")
         self._out_q = self._ctx.Queue()
         self._ctrl_q = self._ctx.Queue()
+        # Mic level is shared memory (no pickling); the queue carries status/text/error only.
+        # Stays negative until the worker is listening.
+        self._rms = self._ctx.Value('f', -1.0)
         self._stt_proc = self._ctx.Process(
             target=stt_worker_main,
-            args=(self._out_q, self._ctrl_q, self._stt_cfg),
+            args=(self._out_q, self._ctrl_q, self._stt_cfg, self._rms),
             daemon=False
         )
         self._stt_proc.start()
@@ -184,19 +242,49 @@ class MainWindow(QMainWindow):
         self._stt_proc = None
         self._out_q = None
         self._ctrl_q = None
+        self._rms = None
+        self._listening = False
+        self._stt_ready = False
+        self._discard_text = False
         self.status_label.setText("Stopped.")
 
-    def toggle(self):
-        if self._stt_proc and self._stt_proc.is_alive():
-            self._stop_stt_process()
+    def _set_listening(self, listening: bool):
+        if self._ctrl_q is None or listening == self._listening:
+            return
+        self._ctrl_q.put("START" if listening else "PAUSE")
+        self._listening = listening
+        if listening:
+            self._idle_timer.stop()
         else:
+            self._arm_idle_timer()
+
+    def _arm_idle_timer(self):
+        # Paused with the model loaded (also right after the warm load, if Start is never pressed)
+        idle_s = self._stt_cfg.get("stt_idle_release_seconds", 0)
+        if idle_s > 0 and self._stt_ready and not self._listening:
+            self._idle_timer.start(int(idle_s * 1000))
+
+    def _release_stt(self):
+        if self._listening or not self._stt_proc:
+            return
+        self._log("STT idle; stopping subprocess to release the model")
+        self._stop_stt_process()
+        self.status_label.setText("STT model released (idle). Start reloads it.")
+
+    def toggle(self):
+        if not (self._stt_proc and self._stt_proc.is_alive()):
             self._start_stt_process()
+        self._set_listening(not self._listening)
 
     def reset(self):
-        self._stop_stt_process()
+        self._set_listening(False)
+        if self._ctrl_q is not None:
+            self._ctrl_q.put("RESET")
+            self._discard_text = True
         self.text_live.clear()
         self.text_edit.clear()
         self.last_report = ""
+        self._invalidate_report_cache()
         self.status_label.setText("Reset.")
 
     def _drain_out_queue(self):
@@ -209,13 +297,26 @@ class MainWindow(QMainWindow):
             self._stt_proc = None
             self._out_q = None
             self._ctrl_q = None
+            self._rms = None
+            self._listening = False
+            self._stt_ready = False
+            self._discard_text = False
             return
 
         if self._out_q is None:
             return
 
-        # Drain messages
+        # Mic level (shared memory), refreshed about once per second
+        now = time.monotonic()
+        if self._listening and self._rms is not None and now - self._last_level_t >= 1.0:
+            self._last_level_t = now
+            rms = self._rms.value
+            if rms >= 0:
+                self.status_label.setText(f"Listening... mic rms={rms:.4f}")
+
+        # Drain messages; corrected text is collected and flushed once per tick
         drained_any = False
+        new_lines: list[str] = []
         while True:
             try:
                 msg = self._out_q.get_nowait()
@@ -239,38 +340,83 @@ class MainWindow(QMainWindow):
                 elif mtype == "audio_level":
                     rms = msg.get("rms", 0.0)
                     self.status_label.setText(f"Listening... mic rms={rms:.4f}")
+                elif mtype == "ready":
+                    self._stt_ready = True
+                    self._arm_idle_timer()
+                elif mtype == "reset":
+                    self._discard_text = False
                 elif mtype == "text":
                     text = msg.get("text", "")
-                    if text:
+                    if text and not self._discard_text:
                         corrected, _changes = self.corrector.correct(text)
-                        self.text_live.append(corrected)
-                        self.text_edit.append(corrected)
+                        new_lines.append(corrected)
                         self._log(f"text: {corrected}")
             except Exception as e:
                 self._log(f"Message handling error: {e!r}")
 
+        if new_lines:
+            self._append_lines(self.text_live, new_lines)
+            self._append_lines(self.text_edit, new_lines)
+            bar = self.text_live.verticalScrollBar()
+            bar.setValue(bar.maximum())
+
         # If started but never received anything for a while, keep UI responsive (no-op)
         return
 
 
+    @staticmethod
+    def _append_lines(edit: QTextEdit, lines: list[str]):
+        """Append lines at the end with one cursor insert (one layout/repaint instead of one per line)."""
+        doc = edit.document()
+        text = "\n".join(lines)
+        if not doc.isEmpty():
+            text = "\n" + text
+        cursor = QTextCursor(doc)
+        cursor.movePosition(QTextCursor.End)
+        edit.setUpdatesEnabled(False)
+        cursor.insertText(text)
+        edit.setUpdatesEnabled(True)
+
+    def _invalidate_report_cache(self):
+        self._last_final_text = None
+        self._last_structured = None
+
     def generate_report(self):
         final_text = self.text_edit.toPlainText().strip()
         if not final_text:
             self.status_label.setText("No text to report.")
             return
-        structured = self.structurer.extract(final_text)
-        report = self.renderer.render(structured=structured, cleaned_text=final_text)
+        if not self.btn_report.isEnabled():
+            return  # already generating
+        self.btn_report.setEnabled(False)
+        self.status_label.setText("Generating report...")
+        QThreadPool.globalInstance().start(
+            _ReportTask(self.structurer, self.renderer, final_text, self._report_signals)
+        )
+
+    def _on_report_ready(self, final_text: str, report: str, structured: dict):
+        self.btn_report.setEnabled(True)
         self.last_report = report
+        self._last_final_text = final_text
+        self._last_structured = structured
         self.text_live.append("\n--- [REPORT] ---\n" + report + "\n--- [/REPORT] ---\n")
         self.status_label.setText("Report generated.")
 
+    def _on_report_failed(self, err: str):
+        self.btn_report.setEnabled(True)
+        self._log(f"report error: {err}")
+        self.status_label.setText(f"Report failed: {err}")
+
     def save(self):
         final_text = self.text_edit.toPlainText().strip()
         if not final_text:
             self.status_label.setText("Nothing to save.")
             return
-        structured = self.structurer.extract(final_text)
-        report = self.last_report or self.renderer.render(structured=structured, cleaned_text=final_text)
+        if final_text == self._last_final_text and self._last_structured is not None:
+            structured, report = self._last_structured, self.last_report
+        else:
+            structured = self.structurer.extract(final_text)
+            report = self.renderer.render(structured=structured, cleaned_text=final_text)
         folder = save_session(
             base_dir=self.sessions_dir,
             raw_text="",